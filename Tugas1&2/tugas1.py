@@ -4,16 +4,28 @@
 import asyncio
 import json
 import math
+import os
+import sys
 import time
 import cv2
 import mediapipe as mp
 import numpy as np
 import websockets
 
+# pose_control.py ada di folder root project
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pose_control import (
+    COMMON_PARSERS, CONTROL_TOKEN, DEFAULT_SETTINGS, handle_message,
+    inference_config, settings_from_env, validate,
+)
+
 # --- KONFIGURASI ---
 CAMERA_INDEX = 0
 PORT = 8765
-filter_mode = '0' # Default Normal
+
+# --- SETTING RUNTIME (bisa diubah via keyboard / WebSocket) ---
+settings = dict(DEFAULT_SETTINGS, filter_mode='0') # Default Normal
+FILTER_MODES = ('0', '1', '2', '3', '4')
 
 # --- SETUP MEDIAPIPE ---
 mp_pose = mp.solutions.pose
@@ -108,47 +120,84 @@ def compute_pose_data(landmarks, width, height):
     data.update(norm_pos)
     return data
 
+# --- KONTROL RUNTIME VIA WEBSOCKET ---
+def parse_filter_mode(value):
+    value = str(value)
+    if value not in FILTER_MODES:
+        raise ValueError("expected one of 0-4")
+    return value
+
+SETTING_PARSERS = dict(COMMON_PARSERS, filter_mode=parse_filter_mode)
+
+def apply_control(updates):
+    parsed = validate(SETTING_PARSERS, updates)
+    settings.update(parsed)
+    return parsed
+
 # --- WEBSOCKET & MAIN LOOP ---
 clients = set()
 async def ws_handler(websocket):
     clients.add(websocket)
     try:
-        async for _ in websocket:
-            pass
+        async for raw in websocket:
+            await handle_message(websocket, raw, apply_control, lambda: settings)
     except:
         pass
     finally:
         clients.remove(websocket)
 
 async def broadcast_pose_loop():
-    global filter_mode
     cap = cv2.VideoCapture(CAMERA_INDEX)
-    
-    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+    pose, pose_config = None, None
+    preview_open = False
+
+    try:
         while True:
+            # Setting inference baru berlaku di frame berikutnya
+            if inference_config(settings) != pose_config:
+                if pose is not None: pose.close()
+                pose_config = inference_config(settings)
+                complexity, det_conf, track_conf = pose_config
+                pose = mp_pose.Pose(model_complexity=complexity,
+                                    min_detection_confidence=det_conf,
+                                    min_tracking_confidence=track_conf)
+
             ret, raw_frame = cap.read()
             if not ret: await asyncio.sleep(0.5); continue
 
             # Mirroring
             frame = cv2.flip(raw_frame, 1)
             h, w, _ = frame.shape
-            
+            filter_mode = settings["filter_mode"]
+            preview = settings["preview"]
+
             # --- PROSES FILTER (TUGAS 1) ---
-            display_frame = apply_filters(frame, filter_mode)
+            # Filter hanya untuk tampilan, jadi dilewati kalau preview mati
+            display_frame = apply_filters(frame, filter_mode) if preview else frame
 
             # Proses Tracking (Pakai frame asli agar akurasi tetap tinggi)
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb)
+            results = None
+            if settings["inference"]:
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                results = pose.process(rgb)
 
-            if results.pose_landmarks:
-                mp_drawing.draw_landmarks(
-                    display_frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style())
+            if results and results.pose_landmarks:
+                if preview and settings["draw"]:
+                    mp_drawing.draw_landmarks(
+                        display_frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
+                        landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style())
 
                 pose_data = compute_pose_data(results.pose_landmarks.landmark, w, h)
                 msg = json.dumps({"type": "pose", "payload": pose_data})
                 if clients: await asyncio.gather(*(c.send(msg) for c in clients))
 
+            if not preview:
+                if preview_open:
+                    cv2.destroyWindow("Tugas 1: Filtering"); cv2.waitKey(1)
+                    preview_open = False
+                await asyncio.sleep(0.01)
+                continue
+
             # UI Text (Menampilkan mode yang aktif)
             mode_text = "Normal"
             if filter_mode == '1': mode_text = "Average Blur 5x5"
@@ -159,23 +208,35 @@ async def broadcast_pose_loop():
             cv2.putText(display_frame, f"Mode: {mode_text} (Tekan 0-4)", (10, 30), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
-            cv2.imshow("Tugas 1: Filtering", display_frame)
+            try: cv2.imshow("Tugas 1: Filtering", display_frame)
+            except cv2.error as e:
+                print(f"Preview unavailable, disabling it: {e}")
+                settings["preview"] = False
+                continue
+            preview_open = True
             
             # --- KEYBOARD CONTROL SESUAI REQUEST ---
             key = cv2.waitKey(1) & 0xFF
             if key == 27 or key == ord('q'): break # ESC atau q untuk keluar
-            elif key == ord('0'): filter_mode = '0' # Normal
-            elif key == ord('1'): filter_mode = '1' # Avg 5x5
-            elif key == ord('2'): filter_mode = '2' # Avg 9x9
-            elif key == ord('3'): filter_mode = '3' # Gaussian
-            elif key == ord('4'): filter_mode = '4' # Sharpen
+            elif key == ord('0'): settings["filter_mode"] = '0' # Normal
+            elif key == ord('1'): settings["filter_mode"] = '1' # Avg 5x5
+            elif key == ord('2'): settings["filter_mode"] = '2' # Avg 9x9
+            elif key == ord('3'): settings["filter_mode"] = '3' # Gaussian
+            elif key == ord('4'): settings["filter_mode"] = '4' # Sharpen
 
             await asyncio.sleep(0.01)
+    finally:
+        if pose is not None: pose.close()
 
     cap.release()
     cv2.destroyAllWindows()
 
 async def main():
+    try: apply_control(settings_from_env(SETTING_PARSERS))
+    except ValueError as e:
+        print(f"Invalid setting in environment: {e}")
+        return
+
     print("Server Tugas 1 Running...")
     print("Controls:")
     print(" 0: Normal")
@@ -184,6 +245,7 @@ async def main():
     print(" 3: Gaussian Blur")
     print(" 4: Sharpening")
     print(" q: Quit")
+    if not CONTROL_TOKEN: print("POSE_CONTROL_TOKEN not set, WebSocket control disabled")
     async with websockets.serve(ws_handler, "0.0.0.0", PORT):
         await broadcast_pose_loop()
 
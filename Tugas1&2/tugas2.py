@@ -4,12 +4,21 @@
 import asyncio
 import json
 import math
+import os
+import sys
 import time
 import cv2
 import mediapipe as mp
 import numpy as np
 import websockets
 
+# pose_control.py ada di folder root project
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pose_control import (
+    COMMON_PARSERS, CONTROL_TOKEN, DEFAULT_SETTINGS, handle_message,
+    inference_config, parse_bool, settings_from_env, validate,
+)
+
 # --- KONFIGURASI ---
 CAMERA_INDEX = 0
 PORT = 8765
@@ -22,6 +31,9 @@ COLOR_RANGES = {
     "KUNING": (np.array([20, 100, 100]),  np.array([35, 255, 255]))
 }
 
+# --- SETTING RUNTIME (bisa diubah via WebSocket) ---
+settings = dict(DEFAULT_SETTINGS, color_detection=True)
+
 # --- SETUP MEDIAPIPE ---
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
@@ -135,14 +147,63 @@ def compute_pose_data(landmarks, width, height, detected_color):
     return data
 
 
+# --- KONTROL RUNTIME VIA WEBSOCKET ---
+def parse_hsv(value):
+    if (not isinstance(value, list) or len(value) != 3
+            or any(isinstance(v, bool) or not isinstance(v, int) or not 0 <= v <= 255 for v in value)):
+        raise ValueError("expected [h, s, v] with integers 0-255")
+    return np.array(value, dtype=np.uint8)
+
+def parse_color_ranges(value):
+    # Format: {"BIRU": [[h, s, v], [h, s, v]], "UNGU": [...], "MERAH": null}
+    # null = hapus warna tersebut, warna lain yang tidak disebut tetap.
+    if not isinstance(value, dict):
+        raise ValueError("expected an object of color -> [lower, upper]")
+    ranges = dict(COLOR_RANGES)
+    for color_name, bounds in value.items():
+        if bounds is None:
+            ranges.pop(color_name, None)
+            continue
+        if not isinstance(bounds, list) or len(bounds) != 2:
+            raise ValueError(f"{color_name}: expected [lower, upper]")
+        ranges[color_name] = (parse_hsv(bounds[0]), parse_hsv(bounds[1]))
+    return ranges
+
+SETTING_PARSERS = dict(
+    COMMON_PARSERS,
+    color_detection=parse_bool,
+    color_ranges=parse_color_ranges,
+)
+
+def apply_control(updates):
+    parsed = validate(SETTING_PARSERS, updates)
+
+    # color_ranges disimpan di COLOR_RANGES, bukan di settings
+    ranges = parsed.pop("color_ranges", None)
+    settings.update(parsed)
+    if ranges is not None:
+        COLOR_RANGES.clear()
+        COLOR_RANGES.update(ranges)
+        parsed["color_ranges"] = sorted(ranges)  # hanya nama warna, untuk log
+    return parsed
+
+def current_settings():
+    state = dict(settings)
+    state["color_ranges"] = {
+        name: [lower.tolist(), upper.tolist()]
+        for name, (lower, upper) in COLOR_RANGES.items()
+    }
+    return state
+
+
 # --- WEBSOCKET ---
 clients = set()
 
 async def ws_handler(websocket):
     clients.add(websocket)
     try:
-        async for _ in websocket:
-            pass
+        async for raw in websocket:
+            await handle_message(websocket, raw, apply_control, current_settings)
     finally:
         clients.remove(websocket)
 
@@ -150,11 +211,22 @@ async def ws_handler(websocket):
 # --- MAIN LOOP ---
 async def broadcast_pose_loop():
     cap = cv2.VideoCapture(CAMERA_INDEX)
+    pose = None
+    pose_config = None
+    preview_open = False
 
-    with mp_pose.Pose(min_detection_confidence=0.5,
-                      min_tracking_confidence=0.5) as pose:
-
+    try:
         while True:
+            # Setting inference baru berlaku di frame berikutnya
+            if inference_config(settings) != pose_config:
+                if pose is not None:
+                    pose.close()
+                pose_config = inference_config(settings)
+                complexity, det_conf, track_conf = pose_config
+                pose = mp_pose.Pose(model_complexity=complexity,
+                                    min_detection_confidence=det_conf,
+                                    min_tracking_confidence=track_conf)
+
             ret, raw_frame = cap.read()
             if not ret:
                 await asyncio.sleep(0.5)
@@ -162,20 +234,27 @@ async def broadcast_pose_loop():
 
             frame = cv2.flip(raw_frame, 1)
             h, w, _ = frame.shape
+            preview = settings["preview"]
 
             # --- DETEKSI WARNA ---
-            display_frame, detected_color = detect_color_object(frame)
-
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb)
-
-            if results.pose_landmarks:
-                mp_drawing.draw_landmarks(
-                    display_frame,
-                    results.pose_landmarks,
-                    mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style()
-                )
+            if settings["color_detection"]:
+                display_frame, detected_color = detect_color_object(frame)
+            else:
+                display_frame, detected_color = frame, "NONE"
+
+            results = None
+            if settings["inference"]:
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                results = pose.process(rgb)
+
+            if results and results.pose_landmarks:
+                if preview and settings["draw"]:
+                    mp_drawing.draw_landmarks(
+                        display_frame,
+                        results.pose_landmarks,
+                        mp_pose.POSE_CONNECTIONS,
+                        landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style()
+                    )
 
                 pose_data = compute_pose_data(
                     results.pose_landmarks.landmark,
@@ -191,18 +270,40 @@ async def broadcast_pose_loop():
                 if clients:
                     await asyncio.gather(*(c.send(msg) for c in clients))
 
-            cv2.imshow("Multi Color Detection (HSV)", display_frame)
-            if cv2.waitKey(1) & 0xFF == 27:
-                break
+            if preview:
+                try:
+                    cv2.imshow("Multi Color Detection (HSV)", display_frame)
+                except cv2.error as e:
+                    print(f"Preview unavailable, disabling it: {e}")
+                    settings["preview"] = False
+                else:
+                    preview_open = True
+                    if cv2.waitKey(1) & 0xFF == 27:
+                        break
+            elif preview_open:
+                cv2.destroyWindow("Multi Color Detection (HSV)")
+                cv2.waitKey(1)
+                preview_open = False
 
             await asyncio.sleep(0.01)
+    finally:
+        if pose is not None:
+            pose.close()
 
     cap.release()
     cv2.destroyAllWindows()
 
 
 async def main():
+    try:
+        apply_control(settings_from_env(SETTING_PARSERS))
+    except ValueError as e:
+        print(f"Invalid setting in environment: {e}")
+        return
+
     print("Server Multi Color + Pose Tracking Running...")
+    if not CONTROL_TOKEN:
+        print("POSE_CONTROL_TOKEN not set, WebSocket control disabled")
     async with websockets.serve(ws_handler, "0.0.0.0", PORT):
         await broadcast_pose_loop()
 
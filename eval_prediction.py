@@ -0,0 +1,71 @@
+"""eval_prediction.py
+Offline check of the fixed-rate output stage in pose_ws_server.py.
+
+Usage:
+    python eval_prediction.py [inference_hz] [latency_s] [motion_hz]
+
+Defaults: 15 Hz inference, 0.05 s latency, 0.5 Hz motion.
+
+A synthetic landmark moves sinusoidally (amplitude 0.2 of the frame width)
+with Gaussian measurement noise. Noisy samples are fed to PoseOutputStage
+`latency` seconds after capture, and the stage is rendered at the configured
+output_rate. The script prints the RMS error in pixels against the true
+position for:
+ - hold: repeating the last inference result (the behaviour without the stage)
+ - stage: the One Euro filtered + extrapolated output
+and the same numbers for a still landmark (pure jitter).
+
+Requires the same packages as pose_ws_server.py (opencv-python, mediapipe,
+websockets, numpy).
+"""
+import sys
+import numpy as np
+
+from pose_ws_server import Landmark, PoseOutputStage, settings
+
+WIDTH, HEIGHT = 640, 480
+NOISE = 0.002       # std dev noise landmark (koordinat ternormalisasi)
+DURATION = 10.0     # detik simulasi
+WARMUP = 1.0        # detik awal yang tidak dihitung
+
+
+def run(inference_hz, latency, motion_hz, seed=0):
+    rng = np.random.default_rng(seed)
+    stage = PoseOutputStage()
+
+    def truth(t):
+        return 0.5 + 0.2 * np.sin(2 * np.pi * motion_hz * t)
+
+    stage_err, hold_err = [], []
+    next_capture, last_raw = 0.0, None
+    for tick in np.arange(0.0, DURATION, 1.0 / settings["output_rate"]):
+        # Hasil inference baru tersedia `latency` detik setelah capture
+        while next_capture <= tick - latency:
+            x = truth(next_capture) + rng.normal(0.0, NOISE)
+            stage.update([Landmark(x, 0.5, 0.0)] * 33, next_capture, WIDTH, HEIGHT)
+            last_raw = x
+            next_capture += 1.0 / inference_hz
+
+        if tick < WARMUP:
+            continue
+        payload = stage.render(tick)
+        stage_err.append((payload["left_wr_pos"][0] - truth(tick)) * WIDTH)
+        hold_err.append((last_raw - truth(tick)) * WIDTH)
+
+    rms = lambda e: float(np.sqrt(np.mean(np.square(e))))
+    return rms(hold_err), rms(stage_err)
+
+
+def main():
+    args = [float(a) for a in sys.argv[1:4]]
+    inference_hz, latency, motion_hz = args + [15.0, 0.05, 0.5][len(args):]
+
+    print(f"inference {inference_hz:g} Hz, latency {latency:g} s, "
+          f"output {settings['output_rate']:g} Hz, noise {NOISE * WIDTH:.2f} px")
+    for label, freq in (("moving", motion_hz), ("still", 0.0)):
+        hold, stage = run(inference_hz, latency, freq)
+        print(f"{label:>6}: hold RMS {hold:6.2f} px | stage RMS {stage:6.2f} px")
+
+
+if __name__ == '__main__':
+    main()
@@ -266,7 +266,7 @@ function applyAngleToBone(key, degAngle) {
         const offsetQ = new THREE.Quaternion().setFromEuler(offsetEuler);
         targetQ = offsetQ.multiply(targetQAxis);
     }
-    bone.quaternion.slerp(targetQ, 0.6);
+    bone.quaternion.slerp(targetQ, rotSmoothing);
 }
 
 function debugListBonesWhenReady() {
@@ -274,9 +274,16 @@ function debugListBonesWhenReady() {
     setTimeout(() => { listAllBoneNames(avatar); }, 500);
 }
 
+// Smoothing client. Kalau server sudah mengirim pose yang di-filter dengan
+// rate tetap (ada field "prediction"), damping di client cukup ringan.
+let rotSmoothing = 0.6;
+let posSmoothing = 0.1;
+
 let lastPose = null;
 function handlePose(pose) {
     lastPose = pose;
+    rotSmoothing = pose.prediction ? 0.9 : 0.6;
+    posSmoothing = pose.prediction ? 0.5 : 0.1;
     if (!Object.keys(boneCache).length) cacheBones();
 
     if (pose.root_position) {
@@ -296,8 +303,8 @@ function handlePose(pose) {
             // Gunakan teknik 'Lerp' (Linear Interpolation) biar geraknya mulus/tidak patah-patah
             let targetX = moveX * sensitivity;
             
-            // Rumus: Posisi Sekarang + (Target - Sekarang) * Kecepatan (0.1)
-            avatar.position.x += (targetX - avatar.position.x) * 0.1;
+            // Rumus: Posisi Sekarang + (Target - Sekarang) * Kecepatan (posSmoothing)
+            avatar.position.x += (targetX - avatar.position.x) * posSmoothing;
             
             // Opsi Tambahan: Geser Naik-Turun (Jongkok)
             // Kalau mau avatar bisa jongkok/naik turun, aktifkan baris bawah ini:
@@ -0,0 +1,142 @@
+# pose_control.py
+# Kontrol runtime lewat WebSocket, dipakai bersama oleh pose_ws_server.py,
+# Tugas1&2/tugas1.py dan Tugas1&2/tugas2.py.
+#
+# Pesan dari client:
+#   {"type": "control", "token": "...", "set": {"preview": false, ...}}
+# Balasan server:
+#   {"type": "control_ack", "ok": true, "settings": {...}}
+#   {"type": "control_ack", "ok": false, "error": "..."}
+
+import hmac
+import json
+import os
+import sys
+
+# Token wajib untuk pesan "control". Kalau kosong, kontrol dimatikan.
+CONTROL_TOKEN = os.environ.get("POSE_CONTROL_TOKEN", "")
+
+# -------------------------------------------------------
+# Parser nilai setting (raise ValueError kalau tidak valid)
+# -------------------------------------------------------
+def parse_bool(value):
+    if not isinstance(value, bool):
+        raise ValueError("expected true/false")
+    return value
+
+def parse_range(low, high):
+    def parser(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError("expected a number")
+        if not low <= value <= high:
+            raise ValueError(f"expected a value between {low} and {high}")
+        return float(value)
+    return parser
+
+def parse_complexity(value):
+    if isinstance(value, bool) or value not in (0, 1, 2):
+        raise ValueError("expected 0, 1 or 2")
+    return int(value)
+
+# Setting yang dimiliki semua server (preview, drawing, MediaPipe Pose)
+DEFAULT_SETTINGS = {
+    "draw": True,        # gambar landmark di preview
+    "preview": True,     # tampilkan jendela cv2.imshow
+    "inference": True,   # jalankan MediaPipe Pose
+    "model_complexity": 1,
+    "min_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5,
+}
+
+COMMON_PARSERS = {
+    "draw": parse_bool,
+    "preview": parse_bool,
+    "inference": parse_bool,
+    "model_complexity": parse_complexity,
+    "min_detection_confidence": parse_range(0.0, 1.0),
+    "min_tracking_confidence": parse_range(0.0, 1.0),
+}
+
+# -------------------------------------------------------
+# Validasi & setting awal
+# -------------------------------------------------------
+def validate(parsers, updates):
+    """Parse every update first so a message is applied all or nothing."""
+    if not isinstance(updates, dict):
+        raise ValueError("'set' must be an object")
+
+    parsed = {}
+    for key, value in updates.items():
+        parser = parsers.get(key)
+        if parser is None:
+            raise ValueError(f"unknown setting: {key}")
+        try:
+            parsed[key] = parser(value)
+        except ValueError as e:
+            raise ValueError(f"{key}: {e}")
+    return parsed
+
+def has_display():
+    # Linux tanpa X11/Wayland (server headless) tidak bisa membuka jendela preview
+    if sys.platform.startswith("linux"):
+        return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return True
+
+def settings_from_env(parsers):
+    """Initial settings from POSE_<NAME> environment variables, e.g. POSE_PREVIEW=0."""
+    updates = {}
+    for key, parser in parsers.items():
+        raw = os.environ.get(f"POSE_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        if parser is parse_bool and value in (0, 1):
+            value = bool(value)
+        updates[key] = value
+
+    if "preview" not in updates and not has_display():
+        updates["preview"] = False
+    return updates
+
+def inference_config(settings):
+    return (
+        settings["model_complexity"],
+        settings["min_detection_confidence"],
+        settings["min_tracking_confidence"],
+    )
+
+# -------------------------------------------------------
+# Pesan WebSocket
+# -------------------------------------------------------
+def is_authorized(token):
+    if not CONTROL_TOKEN or not isinstance(token, str):
+        return False
+    return hmac.compare_digest(token.encode(), CONTROL_TOKEN.encode())
+
+async def handle_message(websocket, raw, apply_control, current_settings):
+    """Handle one incoming message; non-control messages are ignored.
+
+    `apply_control(updates)` menerapkan perubahan (raise ValueError kalau
+    tidak valid), `current_settings()` mengembalikan state untuk balasan.
+    """
+    try:
+        msg = json.loads(raw)
+    except ValueError:
+        return
+    if not isinstance(msg, dict) or msg.get("type") != "control":
+        return
+
+    if not is_authorized(msg.get("token")):
+        reply = {"type": "control_ack", "ok": False, "error": "unauthorized"}
+    else:
+        try:
+            changed = apply_control(msg.get("set", {}))
+            print(f"Control update: {changed}")
+            reply = {"type": "control_ack", "ok": True, "settings": current_settings()}
+        except ValueError as e:
+            reply = {"type": "control_ack", "ok": False, "error": str(e)}
+
+    await websocket.send(json.dumps(reply))
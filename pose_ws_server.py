@@ -2,12 +2,20 @@
 import asyncio
 import json
 import math
+import os
 import time
+import traceback
+from collections import namedtuple
 import cv2
 import mediapipe as mp
 import numpy as np
 import websockets
 
+from pose_control import (
+    COMMON_PARSERS, CONTROL_TOKEN, DEFAULT_SETTINGS, handle_message,
+    inference_config, parse_bool, parse_range, settings_from_env, validate,
+)
+
 # -------------------------------------------------------
 # Mediapipe setup
 # -------------------------------------------------------
@@ -149,6 +157,362 @@ def compute_pose_data(landmarks, width, height):
     data.update(norm_pos)
     return data
 
+# -------------------------------------------------------
+# Camera calibration (ScreenCamera_*.json)
+# -------------------------------------------------------
+# Path ke file PinholeCameraParameters (format Open3D). Kosong = tanpa kalibrasi.
+CALIBRATION_FILE = os.environ.get("POSE_CALIBRATION_FILE", "")
+
+Landmark = namedtuple("Landmark", "x y z")
+
+class CameraCalibration:
+    """Intrinsics from an Open3D PinholeCameraParameters file.
+
+    Open3D menyimpan matriks dalam urutan column-major. Extrinsic di file
+    (pose kamera viewer Open3D) tidak dipakai untuk landmark 2D. File bawaan
+    tidak punya koefisien distorsi; kalau ada key "distortion_coefficients"
+    (format OpenCV: 4, 5, 8, 12 atau 14 angka) nilainya ikut dipakai.
+    """
+
+    DIST_COEFF_COUNTS = (4, 5, 8, 12, 14)
+    ASPECT_TOLERANCE = 0.01
+
+    def __init__(self, intrinsic, width, height, dist_coeffs=None):
+        self.intrinsic = np.asarray(intrinsic, dtype=np.float64)
+        self.width = width
+        self.height = height
+        if dist_coeffs is None:
+            dist_coeffs = np.zeros(5)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+        self.has_distortion = bool(np.any(self.dist_coeffs))
+        self._frame_size = None
+        self._usable = False
+        self._points = np.zeros((33, 1, 2), dtype=np.float64)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            params = json.load(f)
+        if not isinstance(params, dict) or params.get("class_name") != "PinholeCameraParameters":
+            raise ValueError("not a PinholeCameraParameters file")
+
+        intr = params.get("intrinsic")
+        if not isinstance(intr, dict):
+            raise ValueError("intrinsic must be an object")
+        matrix = intr["intrinsic_matrix"]
+        if not is_number_list(matrix) or len(matrix) != 9:
+            raise ValueError("intrinsic_matrix must be 9 numbers")
+        width, height = intr["width"], intr["height"]
+        if not is_number_list([width, height]) or width <= 0 or height <= 0:
+            raise ValueError("invalid intrinsic width/height")
+        intrinsic = np.array(matrix, dtype=np.float64).reshape(3, 3).T
+
+        dist_coeffs = params.get("distortion_coefficients")
+        if dist_coeffs is not None and (
+                not is_number_list(dist_coeffs) or len(dist_coeffs) not in cls.DIST_COEFF_COUNTS):
+            raise ValueError("distortion_coefficients must be a list of "
+                             "4, 5, 8, 12 or 14 numbers")
+        return cls(intrinsic, width, height, dist_coeffs)
+
+    def usable(self, width, height):
+        """Check (once per frame size) that the capture matches the calibration aspect ratio.
+
+        Intrinsics di-skala ke ukuran frame kamera; kalau rasio aspek berbeda
+        (mis. kalibrasi 4:3 dengan webcam 16:9) fx dan fy jadi tidak konsisten,
+        jadi kalibrasi tidak dipakai.
+        """
+        if self._frame_size == (width, height):
+            return self._usable
+        self._frame_size = (width, height)
+
+        calib_aspect = self.width / self.height
+        if abs(width / height - calib_aspect) > self.ASPECT_TOLERANCE * calib_aspect:
+            print(f"[SERVER] calibration is {self.width}x{self.height} but capture is "
+                  f"{width}x{height} (different aspect ratio), calibration disabled")
+            self._usable = False
+            return False
+
+        K = self.intrinsic.copy()
+        K[:2] *= width / self.width
+        self.K = K
+        self.focal = np.array([K[0, 0], K[1, 1]])
+        self.center = np.array([K[0, 2], K[1, 2]])
+        self.scale = np.array([width, height], dtype=np.float64)
+        self._usable = True
+        return True
+
+    # Frame di-mirror (cv2.flip) sebelum inference, sedangkan kalibrasi dibuat
+    # dari frame kamera asli. Karena itu x di-unmirror dulu sebelum memakai K
+    # dan koefisien distorsi, lalu di-mirror lagi untuk landmark hasilnya.
+    # camera_points memakai konvensi kamera OpenCV (frame asli, tidak di-mirror):
+    # x ke kanan dan y ke bawah dari sudut pandang kamera.
+
+    def to_camera(self, image_points):
+        """Mirrored normalized image points (N, 2) -> camera coords (x/z, y/z), no distortion."""
+        raw_x = (1.0 - image_points[:, 0]) * self.scale[0]
+        raw_y = image_points[:, 1] * self.scale[1]
+        return (np.column_stack((raw_x, raw_y)) - self.center) / self.focal
+
+    def undistort(self, landmarks, width, height):
+        """Undistort the landmark points only (not the whole frame).
+
+        Panggil setelah `usable(width, height)` bernilai True. Return
+        (landmarks, camera_points): landmark baru dengan x/y ternormalisasi yang
+        sudah dikoreksi (tetap di-mirror seperti frame), dan koordinat di ruang
+        kamera (x/z, y/z) frame asli, shape (N, 2).
+        """
+        pts = self._points[:len(landmarks)]
+        for k, lm in enumerate(landmarks):
+            pts[k, 0, 0] = (1.0 - lm.x) * width
+            pts[k, 0, 1] = lm.y * height
+
+        if self.has_distortion:
+            camera_points = cv2.undistortPoints(pts, self.K, self.dist_coeffs).reshape(-1, 2)
+        else:
+            camera_points = (pts.reshape(-1, 2) - self.center) / self.focal
+
+        raw = camera_points * self.focal + self.center
+        xs = (1.0 - raw[:, 0] / width).tolist()
+        ys = (raw[:, 1] / height).tolist()
+        undistorted = [Landmark(x, y, lm.z) for x, y, lm in zip(xs, ys, landmarks)]
+        return undistorted, camera_points
+
+def is_number_list(value):
+    return isinstance(value, list) and all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+
+def load_calibration(path):
+    if not path:
+        return None
+    try:
+        calib = CameraCalibration.load(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[SERVER] failed to load calibration {path}: {e}")
+        return None
+    print(f"[SERVER] Loaded calibration {path} ({calib.width}x{calib.height}, "
+          f"distortion={'yes' if calib.has_distortion else 'no'})")
+    return calib
+
+# -------------------------------------------------------
+# Landmark history (ring buffer) + motion features
+# -------------------------------------------------------
+PL = mp_pose.PoseLandmark
+
+HISTORY_SIZE = 64     # jumlah frame yang disimpan per stream
+MOTION_WINDOW = 5     # frame untuk rata-rata velocity / acceleration
+GESTURE_WINDOW = 20   # frame untuk template matching gesture
+GESTURE_THRESHOLD = 0.35  # RMS error maksimum (satuan: lebar bahu)
+
+# Joint yang dikirim velocity & acceleration-nya
+MOTION_JOINTS = {
+    "nose": PL.NOSE,
+    "left_el": PL.LEFT_ELBOW,
+    "right_el": PL.RIGHT_ELBOW,
+    "left_wr": PL.LEFT_WRIST,
+    "right_wr": PL.RIGHT_WRIST,
+    "left_hip": PL.LEFT_HIP,
+    "right_hip": PL.RIGHT_HIP,
+    "left_knee": PL.LEFT_KNEE,
+    "right_knee": PL.RIGHT_KNEE,
+    "left_ank": PL.LEFT_ANKLE,
+    "right_ank": PL.RIGHT_ANKLE,
+}
+
+# Tulang yang dikirim kecepatan sudutnya (nama sama dengan compute_pose_data)
+MOTION_BONES = {
+    "left_upper_arm": (PL.LEFT_SHOULDER, PL.LEFT_ELBOW),
+    "left_lower_arm": (PL.LEFT_ELBOW, PL.LEFT_WRIST),
+    "right_upper_arm": (PL.RIGHT_SHOULDER, PL.RIGHT_ELBOW),
+    "right_lower_arm": (PL.RIGHT_ELBOW, PL.RIGHT_WRIST),
+    "left_upper_leg": (PL.LEFT_HIP, PL.LEFT_KNEE),
+    "left_lower_leg": (PL.LEFT_KNEE, PL.LEFT_ANKLE),
+    "right_upper_leg": (PL.RIGHT_HIP, PL.RIGHT_KNEE),
+    "right_lower_leg": (PL.RIGHT_KNEE, PL.RIGHT_ANKLE),
+}
+
+# Template gesture: lintasan satu joint relatif terhadap posisi awalnya,
+# dalam satuan lebar bahu (x ke kanan gambar, y ke bawah).
+def _line_template(dx, dy, steps=8):
+    t = np.linspace(0.0, 1.0, steps)
+    return np.stack([t * dx, t * dy], axis=1)
+
+GESTURE_TEMPLATES = {
+    "swipe_left": (PL.RIGHT_WRIST, _line_template(-2.0, 0.0)),
+    "swipe_right": (PL.RIGHT_WRIST, _line_template(2.0, 0.0)),
+    "raise_right_hand": (PL.RIGHT_WRIST, _line_template(0.0, -2.0)),
+    "raise_left_hand": (PL.LEFT_WRIST, _line_template(0.0, -2.0)),
+}
+GESTURE_NAMES = list(GESTURE_TEMPLATES)
+GESTURE_JOINTS = np.array([joint for joint, _ in GESTURE_TEMPLATES.values()])
+GESTURE_SHAPES = np.stack([shape for _, shape in GESTURE_TEMPLATES.values()])  # (g, m, 2)
+
+class LandmarkHistory:
+    """Fixed-size ring buffer of landmark frames (x, y, z) for one stream.
+
+    Setiap frame ditulis dua kali (di `head` dan `head + capacity`), jadi
+    N frame terakhir selalu berupa slice berurutan dari buffer: append O(1)
+    tanpa alokasi, dan query window tidak perlu menyalin data.
+    """
+
+    def __init__(self, capacity=HISTORY_SIZE, num_landmarks=33):
+        self.capacity = capacity
+        self.points = np.zeros((2 * capacity, num_landmarks, 3), dtype=np.float64)
+        self.times = np.zeros(2 * capacity, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+        self.frames = 0  # total frame sejak clear(), untuk cooldown gesture
+        self.last_gesture = -GESTURE_WINDOW
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self.frames = 0
+        self.last_gesture = -GESTURE_WINDOW
+
+    def append(self, landmarks, timestamp):
+        i, j = self.head, self.head + self.capacity
+        row = self.points[i]
+        for k, lm in enumerate(landmarks):
+            row[k, 0] = lm.x
+            row[k, 1] = lm.y
+            row[k, 2] = lm.z
+        self.points[j] = row
+        self.times[i] = self.times[j] = timestamp
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.frames += 1
+
+    def window(self, n):
+        """Return views (times, points) of the last n frames, oldest first."""
+        n = min(n, self.count)
+        end = self.head + self.capacity
+        return self.times[end - n:end], self.points[end - n:end]
+
+    def velocities(self, n):
+        """Per-step landmark velocities over the last n frames, shape (n-1, L, 3)."""
+        t, p = self.window(n)
+        dt = np.maximum(np.diff(t), 1e-6)
+        return np.diff(p, axis=0) / dt[:, None, None]
+
+    def accelerations(self, n, velocities=None):
+        """Per-step landmark accelerations over the last n frames, shape (n-2, L, 3).
+
+        `velocities` boleh diisi hasil `velocities(n)` supaya tidak dihitung dua kali.
+        """
+        t, _ = self.window(n)
+        v = self.velocities(n) if velocities is None else velocities
+        mid_t = (t[1:] + t[:-1]) / 2
+        dt = np.maximum(np.diff(mid_t), 1e-6)
+        return np.diff(v, axis=0) / dt[:, None, None]
+
+    def bone_angles(self, n, starts, ends, width, height):
+        """Bone angles in degrees (same convention as angle_between), shape (n, B)."""
+        _, p = self.window(n)
+        d = p[:, ends, :2] - p[:, starts, :2]
+        return np.degrees(np.arctan2(d[..., 1] * height, d[..., 0] * width))
+
+    def angular_velocities(self, n, starts, ends, width, height):
+        """Bone angle derivatives in deg/s, shape (n-1, B)."""
+        t, _ = self.window(n)
+        angles = np.unwrap(np.radians(self.bone_angles(n, starts, ends, width, height)), axis=0)
+        dt = np.maximum(np.diff(t), 1e-6)
+        return np.degrees(np.diff(angles, axis=0)) / dt[:, None]
+
+    def match_gestures(self, n, joints, shapes, width, height):
+        """RMS distance between the last n frames and each gesture template, shape (G,).
+
+        Lintasan joint diukur relatif terhadap titik tengah bahu dan dinormalisasi
+        dengan lebar bahu, lalu di-resample ke panjang template.
+        """
+        _, p = self.window(n)
+        scale = np.array([width, height], dtype=np.float64)
+        pts = p[..., :2] * scale
+        l_sh, r_sh = pts[:, PL.LEFT_SHOULDER], pts[:, PL.RIGHT_SHOULDER]
+        mid_sh = (l_sh + r_sh) / 2
+        sh_width = np.maximum(np.linalg.norm(l_sh - r_sh, axis=1), 1e-6)
+
+        rel = (pts[:, joints] - mid_sh[:, None]) / sh_width[:, None, None]  # (n, G, 2)
+        idx = np.linspace(0, len(rel) - 1, shapes.shape[1]).round().astype(int)
+        traj = rel[idx].transpose(1, 0, 2)  # (G, m, 2)
+        traj = traj - traj[:, :1]
+        return np.sqrt(np.mean(np.sum((traj - shapes) ** 2, axis=-1), axis=-1))
+
+    def trigger_gesture(self, width, height):
+        """Return the matched gesture name once per movement, otherwise None.
+
+        Setelah gesture terpicu, matching dilewati selama GESTURE_WINDOW frame
+        baru supaya gerakan yang sama tidak terkirim berkali-kali.
+        """
+        if self.count < GESTURE_WINDOW or self.frames - self.last_gesture < GESTURE_WINDOW:
+            return None
+
+        errors = self.match_gestures(GESTURE_WINDOW, GESTURE_JOINTS, GESTURE_SHAPES, width, height)
+        best = int(np.argmin(errors))
+        if errors[best] >= GESTURE_THRESHOLD:
+            return None
+        self.last_gesture = self.frames
+        return GESTURE_NAMES[best]
+
+BONE_NAMES = list(MOTION_BONES)
+BONE_STARTS = np.array([a for a, _ in MOTION_BONES.values()])
+BONE_ENDS = np.array([b for _, b in MOTION_BONES.values()])
+JOINT_NAMES = list(MOTION_JOINTS)
+JOINT_INDEX = np.array(list(MOTION_JOINTS.values()))
+
+def compute_motion_data(history, width, height):
+    """Velocity, acceleration, angular velocity and gesture from the history.
+
+    Dihitung sekali per frame lalu ikut dikirim ke semua client. Cooldown
+    gesture disimpan di LandmarkHistory (lihat trigger_gesture).
+    """
+    if history.count < 3:
+        return None
+
+    velocities = history.velocities(MOTION_WINDOW)
+    accelerations = history.accelerations(MOTION_WINDOW, velocities)
+    vel = velocities[:, JOINT_INDEX, :2].mean(axis=0)
+    acc = accelerations[:, JOINT_INDEX, :2].mean(axis=0)
+    ang_vel = history.angular_velocities(
+        MOTION_WINDOW, BONE_STARTS, BONE_ENDS, width, height
+    ).mean(axis=0)
+
+    return {
+        "velocity": dict(zip(JOINT_NAMES, vel.tolist())),
+        "acceleration": dict(zip(JOINT_NAMES, acc.tolist())),
+        "angular_velocity": dict(zip(BONE_NAMES, ang_vel.tolist())),
+        "gesture": history.trigger_gesture(width, height),
+    }
+
+# -------------------------------------------------------
+# Runtime settings (bisa diubah lewat WebSocket)
+# -------------------------------------------------------
+settings = dict(
+    DEFAULT_SETTINGS,
+    motion=True,          # kirim field "motion" (velocity, gesture, dll)
+    undistort=True,       # koreksi landmark dengan kalibrasi (jika ada)
+    camera_space=False,   # kirim field "camera_points" (x/z, y/z)
+    output_rate=60.0,     # Hz, 0 = kirim langsung setiap inference
+    max_extrapolation=0.1,   # detik, batas prediksi ke depan
+    filter_min_cutoff=1.0,   # One Euro: cutoff minimum (Hz)
+    filter_beta=20.0,        # One Euro: respons terhadap kecepatan
+)
+
+SETTING_PARSERS = dict(
+    COMMON_PARSERS,
+    motion=parse_bool,
+    undistort=parse_bool,
+    camera_space=parse_bool,
+    output_rate=parse_range(0.0, 240.0),
+    max_extrapolation=parse_range(0.0, 0.5),
+    filter_min_cutoff=parse_range(0.01, 30.0),
+    filter_beta=parse_range(0.0, 100.0),
+)
+
+def apply_control(updates):
+    parsed = validate(SETTING_PARSERS, updates)
+    settings.update(parsed)
+    return parsed
+
 # -------------------------------------------------------
 # WebSocket server
 # -------------------------------------------------------
@@ -158,14 +522,208 @@ async def ws_handler(websocket):
     print("Client connected")
     clients.add(websocket)
     try:
-        async for _ in websocket:
-            pass
+        async for raw in websocket:
+            await handle_message(websocket, raw, apply_control, lambda: settings)
     except websockets.exceptions.ConnectionClosed:
         pass
     finally:
         clients.remove(websocket)
         print("Client disconnected")
 
+# -------------------------------------------------------
+# Output stage: One Euro filter + fixed-rate publishing
+# -------------------------------------------------------
+STALE_TIMEOUT = 0.5  # detik tanpa inference baru sebelum output berhenti
+ERROR_WINDOW = 30    # jumlah inference terakhir untuk batas error prediksi
+
+async def broadcast(payload):
+    msg = json.dumps({"type": "pose", "payload": payload})
+    if not clients:
+        return
+
+    # Client yang putus di tengah pengiriman tidak boleh menghentikan broadcast;
+    # ws_handler yang akan menghapusnya dari `clients`.
+    results = await asyncio.gather(*(c.send(msg) for c in list(clients)),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception) and not isinstance(
+                result, websockets.exceptions.ConnectionClosed):
+            print(f"[SERVER] send failed: {result!r}")
+
+class OneEuroFilter:
+    """Vectorized One Euro filter over an array of landmarks.
+
+    Selain posisi yang sudah di-smooth, filter juga menyimpan turunan
+    (velocity) yang sudah di-smooth, dipakai untuk extrapolasi.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=20.0, d_cutoff=4.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.dx = None
+        self.t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, x, t):
+        if self.x is None:
+            self.x = x.copy()
+            self.dx = np.zeros_like(x)
+            self.t = t
+            return
+
+        dt = max(t - self.t, 1e-6)
+        self.dx += self._alpha(self.d_cutoff, dt) * ((x - self.x) / dt - self.dx)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.dx)
+        self.x += self._alpha(cutoff, dt) * (x - self.x)
+        self.t = t
+
+    def predict(self, t, max_horizon):
+        """Extrapolate to time t; horizon dibatasi max_horizon detik."""
+        horizon = min(max(t - self.t, 0.0), max_horizon)
+        return self.x + self.dx * horizon, float(horizon)
+
+class PoseOutputStage:
+    """Smooths inference results and renders a pose payload at any time t.
+
+    `update` dipanggil setiap inference selesai (dengan waktu capture frame),
+    `render` dipanggil oleh output_loop dengan rate tetap. Jika inference
+    lebih cepat dari output rate, beberapa hasil sudah digabung filter
+    sebelum tick berikutnya; jika lebih lambat, pose di-extrapolasi.
+
+    `camera_points` dihitung ulang dari pose hasil prediksi. `motion` adalah
+    nilai per inference yang diulang sampai inference berikutnya, kecuali
+    `gesture` yang hanya dikirim sekali.
+    """
+
+    def __init__(self, num_landmarks=33):
+        self.filter = OneEuroFilter()
+        self.size = None
+        self._x = np.zeros((num_landmarks, 3), dtype=np.float64)
+        # Error landmark terbesar per inference (pixel), ring buffer ERROR_WINDOW
+        self._errors = np.zeros(ERROR_WINDOW, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.filter.reset()
+        self.motion = None
+        self.gesture = None
+        self.calib = None
+        self.rms_error = 0.0
+        self._error_head = 0
+        self._error_count = 0
+
+    def record_error(self, err):
+        """Add one inference's per-landmark prediction errors (pixel)."""
+        rms = float(np.sqrt(np.mean(err ** 2)))
+        # EMA dimulai dari sampel pertama, bukan dari 0
+        self.rms_error = rms if self._error_count == 0 else 0.9 * self.rms_error + 0.1 * rms
+        self._errors[self._error_head] = err.max()
+        self._error_head = (self._error_head + 1) % ERROR_WINDOW
+        self._error_count = min(self._error_count + 1, ERROR_WINDOW)
+
+    def error_bounds(self):
+        """Max and p95 of the per-inference worst landmark error over the window."""
+        if self._error_count == 0:
+            return None, None
+        errors = self._errors[:self._error_count]
+        return float(errors.max()), float(np.percentile(errors, 95))
+
+    @property
+    def ready(self):
+        return self.filter.x is not None
+
+    def update(self, landmarks, t, width, height, motion=None, calib=None):
+        for k, lm in enumerate(landmarks):
+            self._x[k, 0] = lm.x
+            self._x[k, 1] = lm.y
+            self._x[k, 2] = lm.z
+
+        # Error prediksi: tebakan filter untuk waktu t vs hasil inference asli (pixel)
+        if self.ready:
+            pred, _ = self.filter.predict(t, settings["max_extrapolation"])
+            err = np.hypot((pred[:, 0] - self._x[:, 0]) * width,
+                           (pred[:, 1] - self._x[:, 1]) * height)
+            self.record_error(err)
+
+        self.filter.min_cutoff = settings["filter_min_cutoff"]
+        self.filter.beta = settings["filter_beta"]
+        self.filter.update(self._x, t)
+        self.size = (width, height)
+        self.calib = calib
+        self.motion = motion
+        if motion and motion["gesture"]:
+            self.gesture = motion["gesture"]
+
+    def render(self, t):
+        if not self.ready or t - self.filter.t > STALE_TIMEOUT:
+            return None
+
+        width, height = self.size
+        pred, horizon = self.filter.predict(t, settings["max_extrapolation"])
+        offset = np.hypot(self.filter.dx[:, 0] * width, self.filter.dx[:, 1] * height) * horizon
+
+        data = compute_pose_data([Landmark(*p) for p in pred.tolist()], width, height)
+        if self.calib:
+            # Landmark di filter sudah di-undistort, cukup K^-1 ke ruang kamera
+            data["camera_points"] = self.calib.to_camera(pred[:, :2]).tolist()
+        if self.motion:
+            data["motion"] = dict(self.motion, gesture=self.gesture)
+            self.gesture = None
+        max_error, p95_error = self.error_bounds()
+        data["prediction"] = {
+            "inference_timestamp": self.filter.t,  # waktu capture inference terakhir
+            "horizon": horizon,                    # detik extrapolasi dari frame terakhir
+            "max_offset": float(offset.max()),     # jarak extrapolasi terbesar (pixel)
+            "rms_error": self.rms_error if self._error_count else None,  # EMA (pixel)
+            "max_error": max_error,                # error terbesar, ERROR_WINDOW inference (pixel)
+            "p95_error": p95_error,                # persentil 95 error terbesar per inference (pixel)
+            "error_samples": self._error_count,    # jumlah inference di window
+        }
+        return data
+
+async def supervise_output(stage):
+    """Run output_loop and restart it (after logging) if it ever crashes."""
+    while True:
+        try:
+            await output_loop(stage)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            print("[SERVER] output loop crashed, restarting:")
+            traceback.print_exc()
+            await asyncio.sleep(0.5)
+
+async def output_loop(stage):
+    next_tick = time.time()
+    while True:
+        rate = settings["output_rate"]
+        if rate <= 0:
+            # Output rate mati: pose dikirim langsung dari broadcast_pose_loop
+            await asyncio.sleep(0.1)
+            next_tick = time.time()
+            continue
+
+        payload = stage.render(time.time())
+        if payload:
+            await broadcast(payload)
+
+        # Jadwal absolut supaya rate tidak drift; kalau tertinggal, mulai ulang
+        next_tick += 1.0 / rate
+        delay = next_tick - time.time()
+        if delay < 0:
+            next_tick = time.time()
+            delay = 0
+        await asyncio.sleep(delay)
+
 # -------------------------------------------------------
 # Pose loop + camera window
 # -------------------------------------------------------
@@ -173,14 +731,31 @@ async def broadcast_pose_loop(cap_index=0):
     cap = cv2.VideoCapture(cap_index)
     print(f"[SERVER] Opening camera index {cap_index} -> isOpened={cap.isOpened()}")
 
-    with mp_pose.Pose(
-        model_complexity=1,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    ) as pose:
+    pose = None
+    pose_config = None
+    preview_open = False
+    history = LandmarkHistory()
+    calib = load_calibration(CALIBRATION_FILE)
+    stage = PoseOutputStage()
+    output_task = asyncio.create_task(supervise_output(stage))
 
+    try:
         while True:
-            ret, frame = cap.read()
+            # Setting inference baru berlaku di frame berikutnya
+            if inference_config(settings) != pose_config:
+                if pose is not None:
+                    pose.close()
+                pose_config = inference_config(settings)
+                complexity, det_conf, track_conf = pose_config
+                pose = mp_pose.Pose(
+                    model_complexity=complexity,
+                    min_detection_confidence=det_conf,
+                    min_tracking_confidence=track_conf
+                )
+
+            # Baca frame & inference di thread lain supaya output_loop tetap jalan
+            ret, frame = await asyncio.to_thread(cap.read)
+            capture_time = time.time()
             if not ret:
                 print("[SERVER] frame read failed")
                 await asyncio.sleep(0.5)
@@ -189,31 +764,72 @@ async def broadcast_pose_loop(cap_index=0):
             frame = cv2.flip(frame, 1)
 
             h, w, _ = frame.shape
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb)
-
-            # Draw the pose landmarks
-            if results.pose_landmarks:
-                mp_drawing.draw_landmarks(
-                    frame,
-                    results.pose_landmarks,
-                    mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style()
-                )
 
-                # Compute pose data
-                pose_data = compute_pose_data(results.pose_landmarks.landmark, w, h)
-                msg = json.dumps({"type": "pose", "payload": pose_data})
+            results = None
+            if settings["inference"]:
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                results = await asyncio.to_thread(pose.process, rgb)
+
+            if results and results.pose_landmarks:
+                # Draw the pose landmarks (hanya berguna kalau preview aktif)
+                if settings["draw"] and settings["preview"]:
+                    mp_drawing.draw_landmarks(
+                        frame,
+                        results.pose_landmarks,
+                        mp_pose.POSE_CONNECTIONS,
+                        landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style()
+                    )
 
-                if clients:
-                    await asyncio.gather(*(c.send(msg) for c in clients))
+                # Compute pose data
+                landmarks = results.pose_landmarks.landmark
+                camera_points = None
+                # Tanpa koefisien distorsi, undistort hanya berguna untuk camera_space
+                if (calib and settings["undistort"]
+                        and (calib.has_distortion or settings["camera_space"])
+                        and calib.usable(w, h)):
+                    landmarks, camera_points = calib.undistort(landmarks, w, h)
+
+                camera_space = camera_points is not None and settings["camera_space"]
+
+                history.append(landmarks, capture_time)
+                motion = compute_motion_data(history, w, h) if settings["motion"] else None
+
+                if settings["output_rate"] > 0:
+                    stage.update(landmarks, capture_time, w, h, motion,
+                                 calib if camera_space else None)
+                else:
+                    pose_data = compute_pose_data(landmarks, w, h)
+                    if camera_space:
+                        pose_data["camera_points"] = camera_points.tolist()
+                    if motion:
+                        pose_data["motion"] = motion
+                    await broadcast(pose_data)
+            else:
+                # Tracking hilang: riwayat lama tidak valid untuk velocity / prediksi
+                history.clear()
+                stage.reset()
 
             # Show camera window
-            cv2.imshow("MediaPipe Pose Feed", frame)
-            if cv2.waitKey(1) & 0xFF == 27:  # ESC exit
-                break
+            if settings["preview"]:
+                try:
+                    cv2.imshow("MediaPipe Pose Feed", frame)
+                except cv2.error as e:
+                    print(f"[SERVER] preview unavailable, disabling it: {e}")
+                    settings["preview"] = False
+                else:
+                    preview_open = True
+                    if cv2.waitKey(1) & 0xFF == 27:  # ESC exit
+                        break
+            elif preview_open:
+                cv2.destroyWindow("MediaPipe Pose Feed")
+                cv2.waitKey(1)
+                preview_open = False
 
             await asyncio.sleep(0.01)
+    finally:
+        output_task.cancel()
+        if pose is not None:
+            pose.close()
 
     cap.release()
     cv2.destroyAllWindows()
@@ -222,9 +838,17 @@ async def broadcast_pose_loop(cap_index=0):
 # Main entry
 # -------------------------------------------------------
 async def main():
+    try:
+        apply_control(settings_from_env(SETTING_PARSERS))
+    except ValueError as e:
+        print(f"[SERVER] invalid setting in environment: {e}")
+        return
+
     print("Starting WebSocket server...")
     await websockets.serve(ws_handler, "0.0.0.0", 8765)
     print("WebSocket server running at ws://0.0.0.0:8765")
+    if not CONTROL_TOKEN:
+        print("[SERVER] POSE_CONTROL_TOKEN not set, control messages disabled")
     await broadcast_pose_loop()
 
 